@@ -1,9 +1,18 @@
 #!/bin/sh
 
 GUNICORN_TIMEOUT=${GUNICORN_TIMEOUT:-300}
-GUNICORN_WORKERS=${GUNICORN_WORKERS:-2}
+GUNICORN_WORKERS=${GUNICORN_WORKERS:-$(nproc)}
+GUNICORN_WORKER_CLASS=${GUNICORN_WORKER_CLASS:-gevent}
+GUNICORN_WORKER_CONNECTIONS=${GUNICORN_WORKER_CONNECTIONS:-1000}
 
 echo "GUNICORN Timeout value: $GUNICORN_TIMEOUT"
 echo "GUNICORN workers value: $GUNICORN_WORKERS"
+echo "GUNICORN worker class: $GUNICORN_WORKER_CLASS"
+echo "GUNICORN worker connections: $GUNICORN_WORKER_CONNECTIONS"
 
-cd src && gunicorn --timeout $GUNICORN_TIMEOUT --workers $GUNICORN_WORKERS --bind 0.0.0.0:5000 app:app
+# Each worker keeps its own database pool of up to DB_POOL_SIZE + DB_MAX_OVERFLOW
+# connections, so workers x pool must stay within the server's max_connections.
+#
+# Database migrations (src/migrate.py) run once per deploy from the deploy workflow, not here,
+# so starting or scaling out containers never builds indices against the live table.
+cd src && gunicorn --config gunicorn.conf.py --timeout $GUNICORN_TIMEOUT --workers $GUNICORN_WORKERS --worker-class $GUNICORN_WORKER_CLASS --worker-connections $GUNICORN_WORKER_CONNECTIONS --bind 0.0.0.0:5000 app:app
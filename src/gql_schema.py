@@ -1,8 +1,24 @@
 from ariadne import QueryType, gql, make_executable_schema, ScalarType
+from ariadne.validation import cost_validator
 from models import Trip, Vendor
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session, load_only
+from graphql import FieldNode, FragmentSpreadNode, GraphQLError, InlineFragmentNode, parse, validate
+from graphql.validation import ASTValidationRule, NoFragmentCyclesRule
 from flask import g
+from database import db
 from datetime import datetime
+from functools import lru_cache
+
+# Hard cap on rows returned by a single list field, whatever `limit` the client sends.
+# `limit` is non-null so every list field is costed by the number of rows it returns.
+MAX_PAGE_SIZE = 1000
+# Maximum nesting of selections in an operation (introspection fields excluded)
+MAX_QUERY_DEPTH = 7
+# Maximum estimated rows across all list fields of an operation
+MAX_QUERY_COST = MAX_PAGE_SIZE
+# Longest query text (in characters) whose parsed document is cached
+MAX_CACHED_QUERY_LENGTH = 10_000
 
 # Define the GraphQL schema in SDL
 type_defs = gql("""
@@ -29,9 +45,9 @@ type_defs = gql("""
     }
 
     type Query {
-        allTrips(limit: Int = 10, offset: Int = 0, vendor_id: Int, start_date: DateTime, end_date: DateTime): [Trip]
+        allTrips(limit: Int! = 10, offset: Int = 0, vendor_id: Int, start_date: DateTime, end_date: DateTime): [Trip]
         tripById(id: String!): Trip
-        allVendors(limit: Int = 10, offset: Int = 0): [Vendor]
+        allVendors(limit: Int! = 10, offset: Int = 0): [Vendor]
         vendorById(id: Int!): Vendor
     }
 """)
@@ -52,37 +68,135 @@ def parse_datetime(value):
     except ValueError:
         raise ValueError("Invalid DateTime format. Expected ISO 8601 string.")
 
+def selected_columns(info, model):
+    """
+    Returns the mapped columns of `model` requested by the current field's selection sets
+    (one per node when the same response key is selected more than once), or None if a
+    selection uses fragments and can't be resolved to plain fields.
+    """
+    columns = {}
+    for field_node in info.field_nodes:
+        for selection in field_node.selection_set.selections:
+            if not isinstance(selection, FieldNode):
+                return None
+            column = model.__table__.columns.get(selection.name.value)
+            if column is not None:
+                columns[column.key] = getattr(model, column.key)
+    return list(columns.values())
+
+# Primary-key lookups, built once at import
+GET_TRIP_BY_ID = select(Trip).where(Trip.id == bindparam("id"))
+GET_VENDOR_BY_ID = select(Vendor).where(Vendor.id == bindparam("id"))
+
 # Resolvers
 query = QueryType()
 
 @query.field("allTrips")
 def resolve_all_trips(_, info, limit, offset, vendor_id=None, start_date=None, end_date=None):
-    session: Session = g.db
-    query = session.query(Trip)
+    session: Session = db
+    query = select(Trip)
+
+    # Only load the columns the client asked for
+    columns = selected_columns(info, Trip)
+    if columns:
+        query = query.options(load_only(*columns))
 
     # Apply filters
     if vendor_id:
-        query = query.filter(Trip.vendor_id == vendor_id)
+        query = query.where(Trip.vendor_id == vendor_id)
     if start_date and end_date:
-        query = query.filter(Trip.pickup_datetime.between(start_date, end_date))
+        query = query.where(Trip.pickup_datetime.between(start_date, end_date))
 
     # Apply pagination
-    return query.limit(limit).offset(offset).all()
+    limit = max(0, min(limit, MAX_PAGE_SIZE))
+    return session.scalars(query.limit(limit).offset(offset)).all()
 
 @query.field("tripById")
 def resolve_trip_by_id(_, info, id):
-    session: Session = g.db
-    return session.query(Trip).filter_by(id=id).first()
+    session: Session = db
+    # Memoize per request so repeated lookups of the same trip only hit the database once
+    trips = g.setdefault("trips_by_id", {})
+    if id not in trips:
+        trips[id] = session.scalars(GET_TRIP_BY_ID, {"id": id}).first()
+    return trips[id]
 
 @query.field("allVendors")
 def resolve_all_vendors(_, info, limit, offset):
-    session: Session = g.db
+    session: Session = db
+    limit = max(0, min(limit, MAX_PAGE_SIZE))
     return session.query(Vendor).limit(limit).offset(offset).all()
 
 @query.field("vendorById")
 def resolve_vendor_by_id(_, info, id):
-    session: Session = g.db
-    return session.query(Vendor).filter_by(id=id).first()
+    session: Session = db
+    return session.scalars(GET_VENDOR_BY_ID, {"id": id}).first()
 
 # Create the executable schema
 schema = make_executable_schema(type_defs, [query, datetime_scalar])
+
+def has_fragment_cycles(document):
+    return bool(validate(schema, document, [NoFragmentCyclesRule]))
+
+@lru_cache(maxsize=512)
+def parse_cached(query_string):
+    # The fragment cycle check needed by validation_rules is cached alongside the document
+    document = parse(query_string)
+    return document, has_fragment_cycles(document)
+
+def query_parser(context_value, data):
+    # Clients send the same handful of query documents over and over, so parsed
+    # documents are cached by query text instead of being re-parsed on every request.
+    # Oversized documents are parsed without caching so they can't pin memory in the cache.
+    query_string = data["query"]
+    if len(query_string) > MAX_CACHED_QUERY_LENGTH:
+        return parse(query_string)
+    return parse_cached(query_string)[0]
+
+class MaxDepthRule(ASTValidationRule):
+    """
+    Rejects operations whose selections nest deeper than MAX_QUERY_DEPTH.
+    """
+    def enter_operation_definition(self, node, *_):
+        depth = self.selection_depth(node.selection_set)
+        if depth > MAX_QUERY_DEPTH:
+            self.report_error(GraphQLError(f"Query depth {depth} exceeds the maximum of {MAX_QUERY_DEPTH}.", node))
+
+    def selection_depth(self, selection_set, visited_fragments=frozenset()):
+        if selection_set is None:
+            return 0
+        depth = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                if not selection.name.value.startswith("__"):
+                    depth = max(depth, 1 + self.selection_depth(selection.selection_set, visited_fragments))
+            elif isinstance(selection, InlineFragmentNode):
+                depth = max(depth, self.selection_depth(selection.selection_set, visited_fragments))
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.context.get_fragment(name)
+                # Fragment cycles are reported by graphql-core's own NoFragmentCyclesRule
+                if fragment is not None and name not in visited_fragments:
+                    depth = max(depth, self.selection_depth(fragment.selection_set, visited_fragments | {name}))
+        return depth
+
+# List fields are costed by the number of rows they may return
+COST_MAP = {
+    "Query": {
+        "allTrips": {"complexity": 1, "multipliers": ["limit"]},
+        "allVendors": {"complexity": 1, "multipliers": ["limit"]},
+    },
+}
+
+def validation_rules(context_value, document, data):
+    # Built per request so the cost validator sees the operation's variables
+    rules = [MaxDepthRule]
+    # ariadne's cost validator recurses forever on fragment cycles; those documents
+    # are rejected by the standard NoFragmentCyclesRule anyway, so only cost the rest
+    query_string = data["query"]
+    if len(query_string) > MAX_CACHED_QUERY_LENGTH:
+        fragment_cycles = has_fragment_cycles(document)
+    else:
+        fragment_cycles = parse_cached(query_string)[1]
+    if not fragment_cycles:
+        rules.append(cost_validator(maximum_cost=MAX_QUERY_COST, variables=data.get("variables"), cost_map=COST_MAP))
+    return rules
@@ -0,0 +1,11 @@
+# Gunicorn server hooks. Settings are passed on the command line by gunicorn.sh.
+
+def post_worker_init(worker):
+    # Gevent workers serve many requests per process on one thread: the worker
+    # monkey-patches the standard library so socket I/O (S3, SQS) yields to other
+    # requests, but psycopg2 is a C extension and would still block the whole
+    # worker while waiting on Postgres. psycogreen installs a wait callback that
+    # makes database round-trips cooperative as well.
+    if "gevent" in worker.cfg.worker_class_str.lower():
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
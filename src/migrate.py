@@ -0,0 +1,22 @@
+"""
+Database setup and maintenance commands.
+
+    python migrate.py                 Create the trips indices and the trip_stats_daily
+                                      materialized view (idempotent). The deploy workflow runs
+                                      this once per deploy, before the new image is rolled out.
+    python migrate.py refresh-stats   Recompute trip_stats_daily. Run this after loading trips
+                                      by any path other than models.bulk_load_trips (which
+                                      refreshes the view itself), e.g. from the ETL worker or cron.
+"""
+import sys
+from database import engine
+from models import initialize_indices, refresh_trip_stats
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "init"
+    if command == "init":
+        initialize_indices(engine)
+    elif command == "refresh-stats":
+        refresh_trip_stats(engine)
+    else:
+        sys.exit(f"Unknown command: {command}\n{__doc__}")
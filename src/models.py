@@ -1,6 +1,9 @@
 from sqlalchemy import create_engine, Column, Integer, Float, String, DateTime, ForeignKey, CHAR
 from sqlalchemy.orm import declarative_base
 from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
@@ -28,27 +31,127 @@ class Trip(Base):
         # Use a dictionary comprehension to exclude _sa_instance_state
         return {key: value for key, value in self.__dict__.items() if not key.startswith('_sa_')}
 
+# Column names in table order, the default column list for bulk_load_trips
+Trip._COLS = tuple(column.name for column in Trip.__table__.columns)
+
+# Names of the indices on trips created by create_indices
+TRIP_INDICES = ("idx_pickup_datetime", "idx_trip_distance", "idx_pickup_location", "idx_dropoff_location", "idx_vendor_id")
+
 def initialize_indices(engine):
-    with engine.connect() as connection:
-        print("Creating indices...")
-        # Index on pickup_datetime
-        # - Speeds up queries filtering by time range (e.g., trips during a specific day/week/month).
-        # - Useful for time-series analyses like peak hours or trends over time.
-        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_pickup_datetime ON trips (pickup_datetime);"))
-        # Index on trip_distance
-        # - Optimizes queries filtering or aggregating by trip distance (e.g., finding long/short trips).
-        # - Useful for fare calculations, distance-based analyses, or detecting anomalies.
-        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_trip_distance ON trips (trip_distance);"))
-        # Composite index on pickup_latitude and pickup_longitude
-        # - Enhances performance for queries based on pickup locations (e.g., finding trips near a specific point or region).
-        # - Useful for geospatial analyses without using PostGIS.
-        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_pickup_location ON trips (pickup_latitude, pickup_longitude);"))
-        # Composite index on dropoff_latitude and dropoff_longitude
-        # - Similar to the pickup location index but for dropoff coordinates.
-        # - Useful for geospatial queries involving dropoff regions or clustering.
-        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_dropoff_location ON trips (dropoff_latitude, dropoff_longitude);"))
-        # Index on vendor_id
-        # - Speeds up queries filtering or grouping by vendor (e.g., analyzing vendor performance or trip counts).
-        # - Useful for aggregations like total trips, average trip duration, or revenue per vendor.
-        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_vendor_id ON trips (vendor_id);"))
-        print("Indices created successfully.")
\ No newline at end of file
+    create_indices(engine)
+    create_trip_stats_view(engine)
+
+def create_indices(engine, concurrently=True):
+    """
+    Create any missing indices on trips. By default they are built with CREATE INDEX CONCURRENTLY,
+    which doesn't block writes to the live table but can't run inside a transaction, so each
+    statement runs on an autocommit connection. bulk_load_trips passes `concurrently=False` after
+    an initial load, when nothing else is using the table yet and a plain build is faster.
+    """
+    concurrent = "CONCURRENTLY " if concurrently else ""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        logger.info("Creating indices...")
+        # A failed concurrent build leaves an invalid index behind that IF NOT EXISTS would skip,
+        # so drop those first and build them again
+        invalid = connection.execute(text("""
+            SELECT indexrelid::regclass::text FROM pg_index
+            WHERE indrelid = 'trips'::regclass AND NOT indisvalid;
+        """)).scalars().all()
+        for index in invalid:
+            connection.execute(text(f"DROP INDEX {concurrent}IF EXISTS {index};"))
+        # Give index builds enough memory to sort in RAM; Postgres also parallelizes each build
+        # across max_parallel_maintenance_workers. Reset before the connection goes back to the pool.
+        connection.execute(text("SET maintenance_work_mem = '1GB';"))
+        try:
+            # Index on pickup_datetime
+            # - Speeds up queries filtering by time range (e.g., trips during a specific day/week/month).
+            # - Useful for time-series analyses like peak hours or trends over time.
+            connection.execute(text(f"CREATE INDEX {concurrent}IF NOT EXISTS idx_pickup_datetime ON trips (pickup_datetime);"))
+            # No BRIN index on pickup_datetime
+            # - BRIN only pays off when rows are stored in pickup order, and loads are not time-sorted,
+            #   so next to the btree above it would only add maintenance. Drop the one earlier releases built.
+            connection.execute(text(f"DROP INDEX {concurrent}IF EXISTS idx_pickup_brin;"))
+            # Index on trip_distance
+            # - Optimizes queries filtering or aggregating by trip distance (e.g., finding long/short trips).
+            # - Useful for fare calculations, distance-based analyses, or detecting anomalies.
+            connection.execute(text(f"CREATE INDEX {concurrent}IF NOT EXISTS idx_trip_distance ON trips (trip_distance);"))
+            # Composite index on pickup_latitude and pickup_longitude
+            # - Enhances performance for queries based on pickup locations (e.g., finding trips near a specific point or region).
+            # - Useful for geospatial analyses without using PostGIS.
+            connection.execute(text(f"CREATE INDEX {concurrent}IF NOT EXISTS idx_pickup_location ON trips (pickup_latitude, pickup_longitude);"))
+            # Composite index on dropoff_latitude and dropoff_longitude
+            # - Similar to the pickup location index but for dropoff coordinates.
+            # - Useful for geospatial queries involving dropoff regions or clustering.
+            connection.execute(text(f"CREATE INDEX {concurrent}IF NOT EXISTS idx_dropoff_location ON trips (dropoff_latitude, dropoff_longitude);"))
+            # Index on vendor_id
+            # - Speeds up queries filtering or grouping by vendor (e.g., analyzing vendor performance or trip counts).
+            # - Useful for aggregations like total trips, average trip duration, or revenue per vendor.
+            connection.execute(text(f"CREATE INDEX {concurrent}IF NOT EXISTS idx_vendor_id ON trips (vendor_id);"))
+        finally:
+            connection.execute(text("RESET maintenance_work_mem;"))
+        logger.info("Indices created successfully.")
+
+def drop_indices(engine):
+    with engine.begin() as connection:
+        logger.info("Dropping indices...")
+        for index in TRIP_INDICES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {index};"))
+        logger.info("Indices dropped successfully.")
+
+def create_trip_stats_view(engine):
+    with engine.begin() as connection:
+        logger.info("Creating trip stats materialized view...")
+        # Materialized view with per-day trip aggregates
+        # - Lets /trips/stats read a handful of pre-aggregated rows instead of scanning the whole trips table.
+        # - Durations are kept as sum/count so the overall average can be derived exactly from the daily rows.
+        # - Must be refreshed after new trips are loaded (see refresh_trip_stats).
+        connection.execute(text("""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS trip_stats_daily AS
+            SELECT date_trunc('day', pickup_datetime) AS day,
+                   count(id) AS total_trips,
+                   sum(trip_duration) AS duration_sum,
+                   count(trip_duration) AS duration_count
+            FROM trips
+            GROUP BY 1;
+        """))
+        # Unique index on day
+        # - Required by REFRESH MATERIALIZED VIEW CONCURRENTLY, so readers are never blocked during a refresh.
+        connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_trip_stats_daily_day ON trip_stats_daily (day);"))
+        logger.info("Trip stats materialized view created successfully.")
+
+def refresh_trip_stats(engine):
+    """
+    Recompute the trip_stats_daily materialized view. Must run after every load of new trips:
+    bulk_load_trips calls it, other load paths should run `python migrate.py refresh-stats`.
+    """
+    with engine.begin() as connection:
+        connection.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY trip_stats_daily;"))
+
+def bulk_load_trips(engine, csv_file, columns=Trip._COLS, initial=None):
+    """
+    Bulk-load trips from a CSV file object (with a header row) using COPY. Intended for the ETL worker.
+    For the initial load (`initial=True`, or by default when trips is empty) the indices are dropped
+    for the duration of the load and built once afterwards instead of being updated for every row.
+    Later loads COPY into the indexed table, so existing data stays indexed for live queries.
+    """
+    if initial is None:
+        with engine.connect() as connection:
+            initial = not connection.execute(text("SELECT EXISTS (SELECT 1 FROM trips);")).scalar()
+
+    if initial:
+        drop_indices(engine)
+    try:
+        connection = engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY trips ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                    csv_file,
+                )
+            connection.commit()
+        finally:
+            connection.close()
+    finally:
+        if initial:
+            create_indices(engine, concurrently=False)
+    refresh_trip_stats(engine)
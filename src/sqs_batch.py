@@ -0,0 +1,90 @@
+import threading
+from collections import deque
+from concurrent.futures import Future
+from uuid import uuid4
+
+class SQSBatchSender:
+    """
+    Coalesces SQS messages sent by concurrent requests into send_message_batch calls.
+    A batch is sent as soon as it holds MAX_BATCH_SIZE messages, or `flush_interval`
+    seconds after its first message was queued, whichever comes first.
+    """
+    # Maximum number of entries SQS accepts in a single send_message_batch call
+    MAX_BATCH_SIZE = 10
+
+    def __init__(self, client, queue_url, flush_interval=0.02):
+        self.client = client
+        self.queue_url = queue_url
+        self.flush_interval = flush_interval
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def send(self, message_body, message_group_id):
+        """
+        Queues a message and returns a Future resolved with its SQS MessageId once its batch has been sent.
+        """
+        entry = {
+            "Id": uuid4().hex,
+            "MessageBody": message_body,
+            "MessageGroupId": message_group_id,
+            "MessageDeduplicationId": str(uuid4()),
+        }
+        future = Future()
+
+        with self._lock:
+            self._pending.append((entry, future))
+            if len(self._pending) >= self.MAX_BATCH_SIZE:
+                batch = self._take_batch()
+            else:
+                batch = None
+                if self._timer is None:
+                    self._timer = threading.Timer(self.flush_interval, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+        if batch:
+            self._send_batch(batch)
+        return future
+
+    def flush(self):
+        """
+        Sends every pending message.
+        """
+        while True:
+            with self._lock:
+                batch = self._take_batch()
+            if not batch:
+                return
+            self._send_batch(batch)
+
+    def _take_batch(self):
+        # Must be called with the lock held
+        size = min(len(self._pending), self.MAX_BATCH_SIZE)
+        batch = [self._pending.popleft() for _ in range(size)]
+        if not self._pending and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _send_batch(self, batch):
+        futures = {entry["Id"]: future for entry, future in batch}
+        try:
+            response = self.client.send_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[entry for entry, _ in batch],
+            )
+        except Exception as e:
+            for future in futures.values():
+                future.set_exception(e)
+            return
+
+        for success in response.get("Successful", []):
+            futures.pop(success["Id"]).set_result(success["MessageId"])
+        for failure in response.get("Failed", []):
+            futures.pop(failure["Id"]).set_exception(
+                RuntimeError(f"SQS rejected message: {failure['Code']} {failure.get('Message', '')}".strip())
+            )
+        # Entries missing from both lists must not leave their senders waiting
+        for future in futures.values():
+            future.set_exception(RuntimeError("SQS returned no result for message"))
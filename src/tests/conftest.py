@@ -1,5 +1,13 @@
 import pytest
-from app import app
+from app import app, engine
+from models import create_trip_stats_view
+
+@pytest.fixture(scope="session")
+def trip_stats_view():
+    """
+    Ensures the trip stats materialized view exists, as migrate.py does on deploy.
+    """
+    create_trip_stats_view(engine)
 
 @pytest.fixture
 def client():
@@ -1,3 +1,6 @@
+from app import engine
+from gql_schema import MAX_CACHED_QUERY_LENGTH, parse_cached
+
 def test_home_route(client):
     """
     Test the home route
@@ -10,7 +13,7 @@ def test_get_trips_without_params(client):
     """
     Test the /trips route without query parameters
     """
-    response = client.get("/trips")
+    response = client.get("/trips", buffered=True)
     assert response.status_code == 200
     assert isinstance(response.json, list)  # Should return a list
 
@@ -21,11 +24,36 @@ def test_get_trips_with_params(client):
     response = client.get("/trips", query_string={
         "pickup_long": -73.93981170654298,
         "pickup_lat": 40.81560134887695
-    })
+    }, buffered=True)
     assert response.status_code == 200
     assert isinstance(response.json, list)  # Should return a list
 
-def test_get_trip_stats(client):
+def test_head_trips_releases_connection(client):
+    """
+    Test that a /trips response whose body is never sent returns its connection to the pool
+    """
+    # buffered=True makes the test client close the response, as the WSGI server does
+    response = client.head("/trips", buffered=True)
+    assert response.status_code == 200
+    assert engine.pool.checkedout() == 0
+
+def test_get_trips_with_invalid_coordinates(client):
+    """
+    Test the /trips route rejects non-numeric coordinates
+    """
+    response = client.get("/trips", query_string={"pickup_long": "east"})
+    assert response.status_code == 400
+    assert "error" in response.json
+
+def test_get_trips_with_empty_coordinates(client):
+    """
+    Test the /trips route treats empty coordinates as not provided
+    """
+    response = client.get("/trips", query_string={"pickup_long": "", "pickup_lat": ""}, buffered=True)
+    assert response.status_code == 200
+    assert isinstance(response.json, list)
+
+def test_get_trip_stats(client, trip_stats_view):
     """
     Test the /trips/stats route
     """
@@ -34,3 +62,37 @@ def test_get_trip_stats(client):
     assert "average_trip_duration" in response.json
     assert "total_days" in response.json
     assert "trips_per_day" in response.json
+
+def test_graphql_rejects_oversized_limit(client):
+    """
+    Test the /graphql route rejects list queries above the maximum cost
+    """
+    response = client.post("/graphql", json={"query": "{ allTrips(limit: 1000000) { id } }"})
+    assert response.status_code == 400
+    assert "errors" in response.json
+
+def test_graphql_rejects_null_limit(client):
+    """
+    Test the /graphql route rejects a null limit instead of serving an uncosted full page
+    """
+    response = client.post("/graphql", json={
+        "query": "{ a: allTrips(limit: null) { id } b: allTrips(limit: null) { id } c: allVendors(limit: null) { id } }",
+    })
+    assert response.status_code == 400
+    assert "errors" in response.json
+
+    response = client.post("/graphql", json={
+        "query": "query($limit: Int) { allTrips(limit: $limit) { id } }",
+        "variables": {"limit": None},
+    })
+    assert response.status_code == 400
+
+def test_graphql_oversized_query_is_not_cached(client):
+    """
+    Test the /graphql route parses oversized query documents without caching them
+    """
+    query = "{ allVendors { id } }" + " " * MAX_CACHED_QUERY_LENGTH
+    cached = parse_cached.cache_info().currsize
+    response = client.post("/graphql", json={"query": query})
+    assert response.status_code == 200
+    assert parse_cached.cache_info().currsize == cached
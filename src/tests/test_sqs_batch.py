@@ -0,0 +1,44 @@
+from sqs_batch import SQSBatchSender
+
+class FakeSQSClient:
+    def __init__(self):
+        self.batches = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.batches.append(Entries)
+        return {"Successful": [{"Id": entry["Id"], "MessageId": f"msg-{entry['Id']}"} for entry in Entries]}
+
+def test_full_batch_is_sent_immediately():
+    """
+    Test that reaching the SQS batch limit sends the batch without waiting for the timer
+    """
+    client = FakeSQSClient()
+    batcher = SQSBatchSender(client, "queue-url", flush_interval=60)
+    futures = [batcher.send(f"body-{i}", "etl-job") for i in range(SQSBatchSender.MAX_BATCH_SIZE)]
+
+    assert len(client.batches) == 1
+    assert [entry["MessageBody"] for entry in client.batches[0]] == [f"body-{i}" for i in range(10)]
+    assert all(future.result(timeout=0).startswith("msg-") for future in futures)
+
+def test_partial_batch_is_sent_after_flush_interval():
+    """
+    Test that a partial batch is sent once the flush interval has elapsed
+    """
+    client = FakeSQSClient()
+    batcher = SQSBatchSender(client, "queue-url", flush_interval=0.01)
+    futures = [batcher.send("body", "etl-job") for _ in range(3)]
+
+    assert all(future.result(timeout=5).startswith("msg-") for future in futures)
+    assert [len(batch) for batch in client.batches] == [3]
+
+def test_entries_missing_from_response_fail():
+    """
+    Test that messages SQS reports neither as sent nor as failed don't leave their futures pending
+    """
+    client = FakeSQSClient()
+    client.send_message_batch = lambda QueueUrl, Entries: {"Successful": [], "Failed": []}
+    batcher = SQSBatchSender(client, "queue-url", flush_interval=60)
+    future = batcher.send("body", "etl-job")
+    batcher.flush()
+
+    assert isinstance(future.exception(timeout=0), RuntimeError)